@@ -7,6 +7,15 @@ from typing import List, Dict, Tuple
 from PyQt5 import QtWidgets, QtCore, QtGui
 import sys
 import glob
+import re
+import copy
+import asyncio
+import csv
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 class FLTSParser:
     def __init__(self, flts_path: str):
@@ -295,18 +304,134 @@ class FLTSParser:
         with open(self.flts_path, 'w') as f:
             f.writelines(self.lines)
 
+class ParseCache:
+    # 以 (path, size, mtime) 为键缓存已解析的 .flts，超过 max_entries 时按 LRU 淘汰
+    # 有未写回修改的解析器不会被淘汰，避免丢失编辑
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (parser, 最近一次与磁盘同步时的文件内容)
+
+    @staticmethod
+    def file_key(flts_path: str) -> Tuple[str, int, float]:
+        path = os.path.abspath(flts_path)
+        st = os.stat(path)
+        return (path, st.st_size, st.st_mtime)
+
+    @staticmethod
+    def has_unsaved_edits(parser: FLTSParser) -> bool:
+        try:
+            return parser.lines != parser.read_flts_file()
+        except OSError:
+            return True
+
+    def get(self, flts_path: str) -> FLTSParser:
+        key = self.file_key(flts_path)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+        # 文件由本程序写回后 size/mtime 会变化；内容与缓存一致，或内存中有未写回的修改时，
+        # 保留原解析器只更新键，不重新解析
+        for old_key, (parser, synced) in list(self.entries.items()):
+            if old_key[0] == key[0]:
+                disk = parser.read_flts_file()
+                if parser.lines == disk or parser.lines != synced:
+                    del self.entries[old_key]
+                    self.entries[key] = (parser, disk)
+                    return parser
+                del self.entries[old_key]
+        parser = FLTSParser(flts_path)
+        self.entries[key] = (parser, list(parser.lines))
+        self._evict()
+        return parser
+
+    def _evict(self):
+        # 从最久未使用的开始淘汰，跳过有未写回修改的解析器；刚加入的条目不淘汰
+        for key in list(self.entries)[:-1]:
+            if len(self.entries) <= self.max_entries:
+                break
+            if not self.has_unsaved_edits(self.entries[key][0]):
+                del self.entries[key]
+
+    def __contains__(self, parser: FLTSParser) -> bool:
+        return any(p is parser for p, _ in self.entries.values())
+
 def run_faults(flts_path: str):
-    dir_path = os.path.dirname(flts_path)
+    dir_path = os.path.dirname(flts_path) or os.getcwd()
     flts_file = os.path.basename(flts_path)
-    original_dir = os.getcwd()
+    # 使用 cwd 而不是 os.chdir，多个文件可在线程中并行运行
+    subprocess.run(['Faults', flts_file], input='\n', text=True, check=True, cwd=dir_path)
+
+# RAM 暂存目录：优先 /dev/shm（tmpfs），可用环境变量 MAGIA_SCRATCH_DIR 覆盖
+SCRATCH_ROOT = os.environ.get('MAGIA_SCRATCH_DIR') or ('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+SCRATCH_PREFIX = 'magia_faults_'
+SCRATCH_MAX_AGE = 24 * 3600  # 超过该秒数的暂存目录视为残留，自动清理
+SCRATCH_KEEP = ('*.dat',)  # 运行结束后拷回项目目录的产物
+
+class DatFileNotFoundError(OSError):
+    # Faults 运行结束但没有生成 .dat；与找不到 Faults 可执行程序（FileNotFoundError）区分
+    pass
+
+def cleanup_stale_scratch(scratch_root: str = None, max_age: float = SCRATCH_MAX_AGE):
+    scratch_root = scratch_root or SCRATCH_ROOT
+    now = time.time()
+    for job_dir in glob.glob(os.path.join(scratch_root, SCRATCH_PREFIX + '*')):
+        try:
+            if now - os.path.getmtime(job_dir) > max_age:
+                shutil.rmtree(job_dir, ignore_errors=True)
+        except OSError:
+            pass
+
+def stage_faults_inputs(flts_path: str, job_dir: str, lines: List[str] = None) -> List[str]:
+    # 拷贝 .flts 以及其中引用到的、位于项目目录下的输入文件（如实验数据、背景文件）
+    # 给出 lines 时写入内存中的内容，而不是拷贝磁盘上的 .flts
+    dir_path = os.path.dirname(os.path.abspath(flts_path))
+    staged = [os.path.basename(flts_path)]
+    if lines is None:
+        shutil.copy2(flts_path, os.path.join(job_dir, staged[0]))
+        with open(flts_path, 'r') as f:
+            lines = f.readlines()
+    else:
+        with open(os.path.join(job_dir, staged[0]), 'w') as f:
+            f.writelines(lines)
+    tokens = set(''.join(lines).split())
+    for token in sorted(tokens):
+        token = os.path.normpath(token.strip('\'"'))
+        src = os.path.join(dir_path, token)
+        if token in staged or os.path.isabs(token) or token.startswith('..') or not os.path.isfile(src):
+            continue
+        dst = os.path.join(job_dir, token)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copy2(src, dst)
+        staged.append(token)
+    return staged
+
+def collect_staged_results(job_dir: str, staged: List[str], dir_path: str, keep: Tuple[str, ...] = SCRATCH_KEEP) -> Tuple[np.ndarray, np.ndarray]:
+    # 只在 Faults 新生成的文件中查找结果，避免误读作为输入拷入的 .dat（staged 中为规范化的相对路径）
+    staged = {os.path.normpath(p) for p in staged}
+    dat_files = [p for p in glob.glob(os.path.join(job_dir, '*.dat'))
+                 if os.path.normpath(os.path.relpath(p, job_dir)) not in staged]
+    if not dat_files:
+        raise DatFileNotFoundError('未找到任何dat文件！')
+    latest_dat = max(dat_files, key=os.path.getmtime)
+    result = read_dat_file(latest_dat)
+    for pattern in keep:
+        for path in glob.glob(os.path.join(job_dir, pattern)):
+            if os.path.normpath(os.path.relpath(path, job_dir)) not in staged:
+                shutil.copy2(path, os.path.join(dir_path, os.path.basename(path)))
+    return result
+
+def run_faults_staged(flts_path: str, scratch_root: str = None, keep: Tuple[str, ...] = SCRATCH_KEEP,
+                      lines: List[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    flts_path = os.path.abspath(flts_path)
+    scratch_root = scratch_root or SCRATCH_ROOT
+    cleanup_stale_scratch(scratch_root)
+    job_dir = tempfile.mkdtemp(prefix=SCRATCH_PREFIX, dir=scratch_root)
     try:
-        if dir_path:
-            os.chdir(dir_path)
-        else:
-            dir_path = original_dir
-        subprocess.run(['Faults', flts_file], input='\n', text=True, check=True)
+        staged = stage_faults_inputs(flts_path, job_dir, lines)
+        run_faults(os.path.join(job_dir, staged[0]))
+        return collect_staged_results(job_dir, staged, os.path.dirname(flts_path), keep)
     finally:
-        os.chdir(original_dir)
+        shutil.rmtree(job_dir, ignore_errors=True)
 
 def read_dat_file(dat_path: str) -> Tuple[np.ndarray, np.ndarray]:
     abs_dat_path = os.path.abspath(dat_path)
@@ -324,6 +449,479 @@ def read_dat_file(dat_path: str) -> Tuple[np.ndarray, np.ndarray]:
     
     return two_theta, np.array(intensities)
 
+def plot_spectra(spectra: List[Tuple[str, np.ndarray, np.ndarray]], title: str = 'Simulated Spectrum'):
+    plt.figure(facecolor='#333333')
+    ax = plt.gca()
+    ax.set_facecolor('#333333')
+    ax.spines['bottom'].set_color('white')
+    ax.spines['top'].set_color('white')
+    ax.spines['right'].set_color('white')
+    ax.spines['left'].set_color('white')
+    ax.tick_params(axis='x', colors='white')
+    ax.tick_params(axis='y', colors='white')
+    ax.yaxis.label.set_color('white')
+    ax.xaxis.label.set_color('white')
+    ax.title.set_color('white')
+    colors = ['cyan', 'orange', 'lime', 'magenta', 'yellow', 'deepskyblue', 'salmon', 'violet']
+    for i, (label, two_theta, intensities) in enumerate(spectra):
+        plt.plot(two_theta, intensities, color=colors[i % len(colors)], label=label)
+    plt.xlabel('2θ')
+    plt.ylabel('Intensity')
+    plt.title(title)
+    plt.grid(True, color='gray')
+    if len(spectra) > 1:
+        plt.legend(facecolor='#333333', labelcolor='white')
+    plt.show()
+
+PEAK_COLUMNS = ('run', 'peak', 'position', 'height', 'fwhm', 'asymmetry', 'intensity')
+PEAK_WINDOW_FWHM = 1.5  # 积分窗口：半高交点向外各延伸 PEAK_WINDOW_FWHM × FWHM
+
+def valley_indices(y: np.ndarray, peaks: np.ndarray) -> np.ndarray:
+    # 相邻峰之间（以及谱图两端到首末峰之间）最低点的下标，长度为 len(peaks) + 1
+    n = y.size
+    idx = np.arange(n)
+    bounds = np.concatenate(([0], peaks, [n - 1]))
+    seg = np.clip(np.searchsorted(bounds, idx, side='right') - 1, 0, bounds.size - 2)
+    seg_min = np.full(bounds.size - 1, np.inf)
+    np.minimum.at(seg_min, seg, y)
+    valley_idx = np.full(seg_min.size, -1)
+    np.maximum.at(valley_idx, seg, np.where(y == seg_min[seg], idx, -1))
+    return valley_idx
+
+def find_peak_indices(intensities: np.ndarray, min_rel_height: float = 0.02,
+                      min_rel_prominence: float = 0.02, noise_factor: float = 8.0,
+                      min_width: int = 3) -> np.ndarray:
+    # 局部极大值，且高出背景（谱图最小值）不低于最大峰高的 min_rel_height
+    y = np.asarray(intensities, dtype=float)
+    if y.size < 3:
+        return np.zeros(0, dtype=int)
+    is_max = (y[1:-1] > y[:-2]) & (y[1:-1] >= y[2:])
+    idx = np.nonzero(is_max)[0] + 1
+    base = y.min()
+    idx = idx[y[idx] - base >= min_rel_height * (y.max() - base)]
+    # 类似 SciPy 的 prominence：峰高减去两侧谷底中较高者，需不低于 min_rel_prominence × 谱图强度范围，
+    # 且不低于 noise_factor × 噪声水平（由逐点差分的中位绝对偏差估计）；半 prominence 处的宽度不少于 min_width 点
+    # 被浅谷隔开的相邻极大值（如噪声）逐轮合并，只保留较高者，再重新计算谷底
+    d = np.diff(y)
+    noise = 1.4826 * np.median(np.abs(d - np.median(d))) / np.sqrt(2)
+    min_prominence = max(min_rel_prominence * (y.max() - base), noise_factor * noise)
+    while idx.size:
+        valleys = valley_indices(y, idx)
+        prominence = y[idx] - np.maximum(y[valleys[:-1]], y[valleys[1:]])
+        low = prominence < min_prominence
+        if not low.any():
+            break
+        heights = y[idx]
+        left_nb = np.concatenate(([-np.inf], heights[:-1]))
+        right_nb = np.concatenate((heights[1:], [-np.inf]))
+        drop = low & ((heights < left_nb) | (heights <= right_nb))
+        idx = idx[~(drop if drop.any() else low)]
+    if idx.size == 0:
+        return idx
+    # 半 prominence 处连续高于该水平的点数，剔除只有一两个点的尖峰
+    left, right = valleys[:-1], valleys[1:]
+    level = y[idx] - 0.5 * prominence
+    points = np.arange(y.size)
+    below = y[None, :] < level[:, None]
+    left_cross = np.where(below & (points[None, :] >= left[:, None]) & (points[None, :] < idx[:, None]),
+                          points[None, :], left[:, None]).max(axis=1)
+    right_cross = np.where(below & (points[None, :] > idx[:, None]) & (points[None, :] <= right[:, None]),
+                           points[None, :], right[:, None]).min(axis=1)
+    return idx[right_cross - left_cross - 1 >= min_width]
+
+def peak_features(two_theta: np.ndarray, intensities: np.ndarray, min_rel_height: float = 0.02,
+                  window_fwhm: float = PEAK_WINDOW_FWHM, min_rel_prominence: float = 0.02,
+                  min_width: int = 3) -> Dict[str, np.ndarray]:
+    x = np.asarray(two_theta, dtype=float)
+    y = np.asarray(intensities, dtype=float)
+    n = min(x.size, y.size)
+    x, y = x[:n], y[:n]
+    peaks = find_peak_indices(y, min_rel_height, min_rel_prominence, min_width=min_width)
+    if peaks.size == 0:
+        return {key: np.zeros(0) for key in PEAK_COLUMNS[2:]}
+    step = np.diff(x).mean()
+
+    # 三点抛物线插值得到峰位和峰高
+    y0, y1, y2 = y[peaks - 1], y[peaks], y[peaks + 1]
+    denom = y0 - 2 * y1 + y2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shift = np.where(denom != 0, 0.5 * (y0 - y2) / denom, 0.0)
+    position = x[peaks] + shift * step
+    height = y1 - 0.25 * (y0 - y2) * shift
+
+    # 相邻峰之间的最低点限定每个峰的范围，两侧较低者作为背景
+    idx = np.arange(n)
+    valley_idx = valley_indices(y, peaks)
+    left, right = valley_idx[:-1], valley_idx[1:]
+    background = np.minimum(y[left], y[right])
+
+    # 半高处的左右交点（线性插值），P×N 掩码一次性求出；重叠峰在谷底处截止
+    half = background + 0.5 * (height - background)
+    below = y[None, :] < half[:, None]
+    in_left = (idx[None, :] >= left[:, None]) & (idx[None, :] < peaks[:, None])
+    in_right = (idx[None, :] > peaks[:, None]) & (idx[None, :] <= right[:, None])
+    left_cross = np.where(below & in_left, idx[None, :], left[:, None]).max(axis=1)
+    right_cross = np.where(below & in_right, idx[None, :], right[:, None]).min(axis=1)
+
+    def crossing(i0, i1):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.where(y[i1] != y[i0], (half - y[i0]) / (y[i1] - y[i0]), 0.0)
+        return x[i0] + np.clip(frac, 0.0, 1.0) * (x[i1] - x[i0])
+
+    left_hw = position - crossing(left_cross, np.minimum(left_cross + 1, n - 1))
+    right_hw = crossing(np.maximum(right_cross - 1, 0), right_cross) - position
+    fwhm = left_hw + right_hw
+    with np.errstate(invalid='ignore', divide='ignore'):
+        asymmetry = np.where(left_hw > 0, right_hw / left_hw, np.nan)
+
+    # 在峰附近的窗口内对扣除背景后的强度做梯形积分，窗口不越过相邻的谷底
+    lo = np.maximum(np.searchsorted(x, position - left_hw - window_fwhm * fwhm), left)
+    hi = np.minimum(np.searchsorted(x, position + right_hw + window_fwhm * fwhm), right)
+    net = np.clip(y[None, :] - background[:, None], 0.0, None)
+    trap = 0.5 * (net[:, 1:] + net[:, :-1]) * np.diff(x)[None, :]
+    in_window = (idx[None, :-1] >= lo[:, None]) & (idx[None, :-1] < hi[:, None])
+    area = (trap * in_window).sum(axis=1)
+    return {
+        'position': position,
+        'height': height - background,
+        'fwhm': fwhm,
+        'asymmetry': asymmetry,
+        'intensity': area,
+    }
+
+def peak_feature_table(spectra: List[Tuple[str, np.ndarray, np.ndarray]], tolerance: float = None,
+                       min_rel_height: float = 0.02) -> Dict[str, np.ndarray]:
+    # 返回 run × peak 的列式表；同一衍射峰在不同谱图中以 2θ 最近邻一一匹配，共用同一个 peak 编号
+    # 参考峰位随每次匹配更新为最近一次的位置，逐渐漂移的峰仍保持同一编号
+    reference = np.zeros(0)
+    columns = {key: [] for key in PEAK_COLUMNS}
+    for label, two_theta, intensities in spectra:
+        feats = peak_features(two_theta, intensities, min_rel_height)
+        pos = feats['position']
+        tol = tolerance if tolerance is not None else np.nan_to_num(feats['fwhm'], nan=0.0)
+        tol = np.broadcast_to(tol, pos.shape)
+        ids = np.full(pos.size, -1)
+        if reference.size and pos.size:
+            # 只在容差内的候选对中按距离从小到大贪心分配，每个参考峰最多匹配一个峰
+            dist = np.abs(pos[:, None] - reference[None, :])
+            cand_p, cand_r = np.nonzero(dist <= tol[:, None])
+            order = np.argsort(dist[cand_p, cand_r], kind='stable')
+            taken = np.zeros(reference.size, dtype=bool)
+            for p, r in zip(cand_p[order].tolist(), cand_r[order].tolist()):
+                if ids[p] < 0 and not taken[r]:
+                    ids[p] = r
+                    taken[r] = True
+            matched = ids >= 0
+            reference[ids[matched]] = pos[matched]
+        new = ids < 0
+        ids[new] = reference.size + np.arange(new.sum())
+        reference = np.concatenate((reference, pos[new]))
+        columns['run'].append(np.full(pos.size, label, dtype=object))
+        columns['peak'].append(ids)
+        for key in PEAK_COLUMNS[2:]:
+            columns[key].append(feats[key])
+    return {key: np.concatenate(vals) if vals else np.zeros(0) for key, vals in columns.items()}
+
+def save_feature_table(table: Dict[str, np.ndarray], csv_path: str):
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(PEAK_COLUMNS)
+        for row in zip(*(table[key] for key in PEAK_COLUMNS)):
+            writer.writerow([row[0], int(row[1])] + [f"{v:.6g}" for v in row[2:]])
+
+class Session:
+    # 不依赖 Qt 的脚本接口：在内存中修改 .flts，运行时写入暂存目录，不改写原文件
+    # 例如：
+    #   base = Session('model.flts')
+    #   variants = [base.copy() for _ in probs]
+    #   for s, p in zip(variants, probs):
+    #       s.set('TRANSITIONS', 'layer 1 to layer 2', 'LT', 0, p)
+    #   results = await run_sessions(variants, limit=8)
+    def __init__(self, flts_path: str = None, scratch_root: str = None, keep: Tuple[str, ...] = (),
+                 parser: FLTSParser = None):
+        # 给出 parser 时直接使用（不重新读取文件），否则解析 flts_path
+        if parser is None:
+            if flts_path is None:
+                raise ValueError('either flts_path or parser is required')
+            parser = FLTSParser(flts_path)
+        self.parser = parser
+        self.flts_path = self.parser.flts_path
+        self.scratch_root = scratch_root
+        self.keep = keep
+
+    def copy(self) -> 'Session':
+        return Session(scratch_root=self.scratch_root, keep=self.keep, parser=copy.deepcopy(self.parser))
+
+    def _param(self, section: str, subsection: str, key: str) -> Dict:
+        sec = self.parser.sections[section]
+        return sec['subsections'][subsection]['params'][key] if subsection else sec['params'][key]
+
+    def get(self, section: str, subsection: str, key: str, index: int) -> str:
+        return self._param(section, subsection, key)['values'][index]
+
+    @staticmethod
+    def format_value(value) -> str:
+        # 整数保持整数形式（如层数），浮点数保留完整精度
+        if isinstance(value, (int, np.integer)):
+            return str(int(value))
+        if isinstance(value, (float, np.floating)):
+            return repr(float(value))
+        return str(value)
+
+    def set(self, section: str, subsection: str, key: str, index: int, value):
+        # 只修改本行第 index 个数值；不经过 update_parameter（其 value_idx == 1 表示第二行）
+        param = self._param(section, subsection, key)
+        values = param['values']
+        if not 0 <= index < len(values):
+            raise IndexError(f'{section}/{subsection}/{key} has {len(values)} values, got index {index}')
+        values[index] = self.format_value(value)
+        line_idx = param['line_idx']
+        line = self.parser.lines[line_idx]
+        indentation = len(line) - len(line.lstrip())
+        # TITLE 的文本行没有关键字，其他行保留行首关键字（如 Atom、INFINITE）
+        if key == 'Title_Text':
+            new_line = ' '.join(values)
+        else:
+            new_line = ' '.join([line.split()[0]] + values).rstrip()
+        self.parser.lines[line_idx] = ' ' * indentation + new_line + '\n'
+
+    def set_many(self, keys: List[Tuple[str, str, str, int]], values):
+        values = values.tolist() if isinstance(values, np.ndarray) else list(values)
+        if len(values) != len(keys):
+            raise ValueError(f'expected {len(keys)} values, got {len(values)}')
+        for key, value in zip(keys, values):
+            self.set(*key, value)
+
+    def get_transition_matrix(self) -> np.ndarray:
+        return get_transition_matrix(self.parser)
+
+    def set_transition_matrix(self, matrix: np.ndarray) -> int:
+        return set_transition_matrix(self.parser, np.asarray(matrix, dtype=float))
+
+    def save(self):
+        self.parser.write_flts_file()
+
+    def run(self) -> Tuple[np.ndarray, np.ndarray]:
+        return run_faults_staged(self.flts_path, self.scratch_root, self.keep, self.parser.lines)
+
+    async def run_async(self) -> Tuple[np.ndarray, np.ndarray]:
+        scratch_root = self.scratch_root or SCRATCH_ROOT
+        job_dir = tempfile.mkdtemp(prefix=SCRATCH_PREFIX, dir=scratch_root)
+        try:
+            staged = stage_faults_inputs(self.flts_path, job_dir, self.parser.lines)
+            proc = await asyncio.create_subprocess_exec('Faults', staged[0], cwd=job_dir, stdin=asyncio.subprocess.PIPE)
+            try:
+                await proc.communicate(b'\n')
+            except BaseException:
+                # 任务被取消（如在 notebook 中中断）时结束 Faults 进程，再删除其工作目录
+                if proc.returncode is None:
+                    proc.kill()
+                    await proc.wait()
+                raise
+            if proc.returncode:
+                raise subprocess.CalledProcessError(proc.returncode, ['Faults', staged[0]])
+            return collect_staged_results(job_dir, staged, os.path.dirname(self.flts_path), self.keep)
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+async def run_sessions(sessions: List[Session], limit: int = None, return_exceptions: bool = False) -> List:
+    # 并发运行多个 Session，最多同时运行 limit 个 Faults 进程（默认 CPU 核数）
+    # return_exceptions=True 时失败的 Session 以异常对象返回，不影响其余结果
+    semaphore = asyncio.Semaphore(limit or os.cpu_count() or 1)
+    for scratch_root in {s.scratch_root or SCRATCH_ROOT for s in sessions}:
+        cleanup_stale_scratch(scratch_root)
+
+    async def run_one(session: Session):
+        async with semaphore:
+            return await session.run_async()
+    return await asyncio.gather(*(run_one(s) for s in sessions), return_exceptions=return_exceptions)
+
+TRANSITION_RE = re.compile(r'layer\s+(\d+)\s+to\s+layer\s+(\d+)', re.IGNORECASE)
+
+def transition_pairs(parser: FLTSParser) -> Dict[Tuple[int, int], str]:
+    # 依赖 "!layer i to layer j" 注释，返回 (i, j)（从 0 开始）到子段名的映射
+    pairs = {}
+    subs = parser.sections.get('TRANSITIONS', {}).get('subsections', {})
+    for subsection, sdata in subs.items():
+        m = TRANSITION_RE.search(subsection)
+        if m and 'LT' in sdata.get('params', {}):
+            pairs[(int(m.group(1)) - 1, int(m.group(2)) - 1)] = subsection
+    return pairs
+
+def transition_layer_count(parser: FLTSParser) -> int:
+    pairs = transition_pairs(parser)
+    n = max((max(i, j) + 1 for i, j in pairs), default=0)
+    nlayers = parser.sections.get('STRUCTURAL', {}).get('params', {}).get('NLAYERS')
+    if nlayers and nlayers['values']:
+        try:
+            n = max(n, int(nlayers['values'][0]))
+        except ValueError:
+            pass
+    return n
+
+def get_transition_matrix(parser: FLTSParser) -> np.ndarray:
+    # LT 第一个数值为跃迁概率；文件中不存在的 (i, j) 为 NaN
+    n = transition_layer_count(parser)
+    matrix = np.full((n, n), np.nan)
+    subs = parser.sections.get('TRANSITIONS', {}).get('subsections', {})
+    for (i, j), subsection in transition_pairs(parser).items():
+        try:
+            matrix[i, j] = float(subs[subsection]['params']['LT']['values'][0])
+        except (IndexError, ValueError):
+            matrix[i, j] = 0.0
+    return matrix
+
+def set_transition_matrix(parser: FLTSParser, matrix: np.ndarray) -> int:
+    # 一次遍历写回 LT 的概率值，只改本行第一个数值，不动下方内容；返回写入的条目数
+    # 只写回数值有变化的条目，并保留完整精度，未修改的行保持原样
+    subs = parser.sections.get('TRANSITIONS', {}).get('subsections', {})
+    written = 0
+    for (i, j), subsection in transition_pairs(parser).items():
+        if i >= matrix.shape[0] or j >= matrix.shape[1] or np.isnan(matrix[i, j]):
+            continue
+        lt_param = subs[subsection]['params']['LT']
+        values = lt_param['values'] or ['']
+        try:
+            current = float(values[0])
+        except ValueError:
+            current = 0.0
+        if current == matrix[i, j]:
+            continue
+        values[0] = repr(float(matrix[i, j]))
+        line_idx = lt_param['line_idx']
+        indentation = len(parser.lines[line_idx]) - len(parser.lines[line_idx].lstrip())
+        parser.lines[line_idx] = ' ' * indentation + 'LT ' + ' '.join(values) + '\n'
+        lt_param['values'] = values
+        written += 1
+    return written
+
+def normalize_transition_rows(matrix: np.ndarray) -> np.ndarray:
+    sums = np.nansum(matrix, axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(sums > 0, matrix / sums, matrix)
+
+def symmetric_fill_transitions(matrix: np.ndarray) -> np.ndarray:
+    # 为 0 的元素由转置位置的值补齐（NaN 表示文件中不存在该跃迁，保持不变）
+    return np.where((matrix == 0) & ~np.isnan(matrix.T), matrix.T, matrix)
+
+def fault_transition_matrix(n: int, fault_probs: Dict[int, float]) -> np.ndarray:
+    # 层偏移量 -> 概率：正常堆垛为 i -> i+1，其余概率留给偏移 1
+    # 例如孪晶层错 {-1: p}，形变层错 {2: p}
+    probs = np.array(list(fault_probs.values()), dtype=float)
+    if np.any(~np.isfinite(probs) | (probs < 0) | (probs > 1)) or probs.sum() > 1:
+        raise ValueError('层错概率必须在 [0, 1] 之间，且总和不超过 1。')
+    if n == 0:
+        return np.zeros((0, 0))
+    # 层数较少时偏移量会按 n 取模回绕（如 n=2 时 +2 变成自身、-1 等同正常堆垛），此时拒绝生成
+    residues = {1 % n}
+    for offset, prob in fault_probs.items():
+        if prob == 0:
+            continue
+        if abs(offset) >= n or offset % n in residues:
+            raise ValueError(f'层数为 {n} 时偏移量 {offset:+d} 的层错与正常堆垛或其他层错重合。')
+        residues.add(offset % n)
+    eye = np.eye(n)
+    matrix = (1.0 - sum(fault_probs.values())) * np.roll(eye, 1, axis=1)
+    for offset, prob in fault_probs.items():
+        matrix += prob * np.roll(eye, offset % n, axis=1)
+    return matrix
+
+class TransitionMatrixDialog(QtWidgets.QDialog):
+    def __init__(self, parser: FLTSParser, parent=None):
+        super().__init__(parent)
+        self.parser = parser
+        self.matrix = get_transition_matrix(parser)
+        n = self.matrix.shape[0]
+        self.setWindowTitle("Transition matrix (LT probability)")
+        self.setStyleSheet("background-color: #333333; color: white;")
+        vlay = QtWidgets.QVBoxLayout(self)
+
+        self.table = QtWidgets.QTableWidget(n, n)
+        self.table.setStyleSheet("background-color: #555555; color: white;")
+        self.table.setHorizontalHeaderLabels([f"to {j + 1}" for j in range(n)])
+        self.table.setVerticalHeaderLabels([f"from {i + 1}" for i in range(n)])
+        vlay.addWidget(self.table)
+
+        gen_box = QtWidgets.QGroupBox("Generate from fault probabilities")
+        gen_layout = QtWidgets.QHBoxLayout(gen_box)
+        gen_layout.addWidget(QtWidgets.QLabel("twin (i→i-1)"))
+        self.twin_edit = QtWidgets.QLineEdit("0.0")
+        gen_layout.addWidget(self.twin_edit)
+        gen_layout.addWidget(QtWidgets.QLabel("deformation (i→i+2)"))
+        self.deform_edit = QtWidgets.QLineEdit("0.0")
+        gen_layout.addWidget(self.deform_edit)
+        gen_btn = QtWidgets.QPushButton("Generate")
+        gen_btn.clicked.connect(self.generate)
+        gen_layout.addWidget(gen_btn)
+        vlay.addWidget(gen_box)
+
+        btn_row = QtWidgets.QHBoxLayout()
+        for text, slot in (("Normalize rows", self.normalize), ("Symmetric fill", self.symmetric_fill),
+                           ("Apply", self.apply), ("Close", self.reject)):
+            btn = QtWidgets.QPushButton(text)
+            btn.setStyleSheet("background-color: #555555; color: white;")
+            btn.clicked.connect(slot)
+            btn_row.addWidget(btn)
+        vlay.addLayout(btn_row)
+        self.fill_table()
+
+    def fill_table(self):
+        n = self.matrix.shape[0]
+        for i in range(n):
+            for j in range(n):
+                val = self.matrix[i, j]
+                item = QtWidgets.QTableWidgetItem('' if np.isnan(val) else repr(float(val)))
+                if np.isnan(val):
+                    # 文件中没有对应的 "!layer i to layer j" 段，无法写回
+                    item.setFlags(QtCore.Qt.NoItemFlags)
+                self.table.setItem(i, j, item)
+
+    def read_table(self) -> bool:
+        n = self.matrix.shape[0]
+        for i in range(n):
+            for j in range(n):
+                if np.isnan(self.matrix[i, j]):
+                    continue
+                text = self.table.item(i, j).text().strip()
+                try:
+                    self.matrix[i, j] = float(text) if text else 0.0
+                except ValueError:
+                    QtWidgets.QMessageBox.critical(self, "错误", f"无效数值：from {i + 1} to {j + 1}：{text}")
+                    return False
+        return True
+
+    def normalize(self):
+        if self.read_table():
+            self.matrix = normalize_transition_rows(self.matrix)
+            self.fill_table()
+
+    def symmetric_fill(self):
+        if self.read_table():
+            self.matrix = symmetric_fill_transitions(self.matrix)
+            self.fill_table()
+
+    def generate(self):
+        try:
+            faults = {-1: float(self.twin_edit.text()), 2: float(self.deform_edit.text())}
+        except ValueError:
+            QtWidgets.QMessageBox.critical(self, "错误", "层错概率必须为数值。")
+            return
+        try:
+            generated = fault_transition_matrix(self.matrix.shape[0], faults)
+        except ValueError as err:
+            QtWidgets.QMessageBox.critical(self, "错误", str(err))
+            return
+        missing = np.isnan(self.matrix) & (generated != 0)
+        self.matrix = np.where(np.isnan(self.matrix), np.nan, generated)
+        self.fill_table()
+        if missing.any():
+            QtWidgets.QMessageBox.warning(self, "警告", f"有 {int(missing.sum())} 个非零跃迁在文件中没有对应的段，已忽略。")
+
+    def apply(self):
+        if self.read_table():
+            set_transition_matrix(self.parser, self.matrix)
+            self.accept()
+
 class GUI(QtWidgets.QMainWindow):
     def __init__(self, parser: FLTSParser, flts_path: str, dat_path: str):
         super().__init__()
@@ -355,6 +953,10 @@ class GUI(QtWidgets.QMainWindow):
         self.create_stacking_transitions_tab()
         self.create_calculation_tab()
 
+        self.scratch_check = QtWidgets.QCheckBox(f"RAM scratch ({SCRATCH_ROOT})")
+        self.scratch_check.setStyleSheet("color: white;")
+        self.layout.addWidget(self.scratch_check)
+
         self.run_button = QtWidgets.QPushButton("Apply & Run")
         self.run_button.setStyleSheet("background-color: #555555; color: white;")
         self.run_button.clicked.connect(self.apply_and_run)
@@ -646,6 +1248,12 @@ class GUI(QtWidgets.QMainWindow):
         form.addWidget(fw_box, row, 0, 1, 8)
         row += 1
 
+        matrix_btn = QtWidgets.QPushButton("Transition matrix...")
+        matrix_btn.setStyleSheet("background-color: #555555; color: white;")
+        matrix_btn.clicked.connect(self.open_transition_matrix)
+        form.addWidget(matrix_btn, row, 0, 1, 2)
+        row += 1
+
         for subsection, subdata in subs.items():
             lbl = QtWidgets.QLabel(subsection)
             lbl.setStyleSheet("font-weight:bold; color:white;")
@@ -716,6 +1324,26 @@ class GUI(QtWidgets.QMainWindow):
                             ent.setStyleSheet("background-color: #555555; color: white;")
         QtWidgets.QMessageBox.information(self, "完成", "已将全局 FW 应用到所有 TRANSITIONS 的 FW 条目。")
 
+    def open_transition_matrix(self):
+        dialog = TransitionMatrixDialog(self.parser, self)
+        if dialog.exec_() != QtWidgets.QDialog.Accepted:
+            return
+        # 更新界面显示
+        subs = self.parser.sections['TRANSITIONS']['subsections']
+        for subsection in transition_pairs(self.parser).values():
+            val = subs[subsection]['params']['LT']['values'][0]
+            ent = self.entries.get(('TRANSITIONS', subsection, 'LT', 0))
+            if ent:
+                ent.setText(val)
+                try:
+                    is_non_zero = float(val) != 0.0
+                except Exception:
+                    is_non_zero = False
+                if is_non_zero:
+                    ent.setStyleSheet("background-color: #555555; color: red; font-weight: bold;")
+                else:
+                    ent.setStyleSheet("background-color: #555555; color: white;")
+
     def make_update_param(self, section, subsection, param_key, value_idx, entry):
         def handler():
             new_val = entry.text()
@@ -733,40 +1361,203 @@ class GUI(QtWidgets.QMainWindow):
 
     def apply_and_run(self):
         self.parser.write_flts_file()
-        run_faults(self.flts_path)
-        dat_files = glob.glob(os.path.join(os.path.dirname(self.flts_path), '*.dat'))
-        if not dat_files:
+        try:
+            if self.scratch_check.isChecked():
+                # 在 tmpfs 上运行，直接从内存读取结果，只拷回需要保留的产物
+                two_theta, intensities = run_faults_staged(self.flts_path)
+            else:
+                run_faults(self.flts_path)
+                dat_files = glob.glob(os.path.join(os.path.dirname(self.flts_path), '*.dat'))
+                if not dat_files:
+                    raise DatFileNotFoundError('未找到任何dat文件！')
+                latest_dat = max(dat_files, key=os.path.getmtime)
+                two_theta, intensities = read_dat_file(latest_dat)
+        except DatFileNotFoundError:
             QtWidgets.QMessageBox.critical(self, "错误", "未找到任何dat文件！")
             return
-        latest_dat = max(dat_files, key=os.path.getmtime)
-        two_theta, intensities = read_dat_file(latest_dat)
-        import matplotlib.pyplot as plt
-        plt.figure(facecolor='#333333')
-        ax = plt.gca()
-        ax.set_facecolor('#333333')
-        ax.spines['bottom'].set_color('white')
-        ax.spines['top'].set_color('white')
-        ax.spines['right'].set_color('white')
-        ax.spines['left'].set_color('white')
-        ax.tick_params(axis='x', colors='white')
-        ax.tick_params(axis='y', colors='white')
-        ax.yaxis.label.set_color('white')
-        ax.xaxis.label.set_color('white')
-        ax.title.set_color('white')
-        plt.plot(two_theta, intensities, color='cyan')
-        plt.xlabel('2θ')
-        plt.ylabel('Intensity')
-        plt.title('Simulated Spectrum')
-        plt.grid(True, color='gray')
-        plt.show()
+        except (OSError, ValueError, IndexError, subprocess.CalledProcessError) as e:
+            # 例如 Faults 不在 PATH 中，或运行失败
+            QtWidgets.QMessageBox.critical(self, "错误", f"运行 Faults 失败：{e}")
+            return
+        plot_spectra([(os.path.basename(self.flts_path), two_theta, intensities)])
+
+class FaultsBatchThread(QtCore.QThread):
+    # 在后台线程中并行运行多个 .flts（每个文件使用独立的暂存目录），结束后通过 done 信号返回谱图和错误
+    done = QtCore.pyqtSignal(list, list)
+
+    def __init__(self, flts_paths: List[str], parent=None):
+        super().__init__(parent)
+        self.flts_paths = flts_paths
+
+    def run(self):
+        spectra, errors = [], []
+        with ThreadPoolExecutor(max_workers=min(len(self.flts_paths), os.cpu_count() or 1)) as pool:
+            futures = [pool.submit(run_faults_staged, path) for path in self.flts_paths]
+            for path, fut in zip(self.flts_paths, futures):
+                name = os.path.basename(path)
+                try:
+                    two_theta, intensities = fut.result()
+                    spectra.append((name, two_theta, intensities))
+                except (OSError, ValueError, IndexError, subprocess.CalledProcessError) as e:
+                    errors.append(f"{name}: {e}")
+        self.done.emit(spectra, errors)
+
+class Workspace(QtWidgets.QMainWindow):
+    # 多文件工作区：左侧文件列表，右侧为每个文件缓存的编辑器，切换时不重新解析/重建控件
+    def __init__(self, flts_paths: List[str], cache_size: int = 16):
+        super().__init__()
+        self.cache = ParseCache(cache_size)
+        self.editors = {}  # abspath -> (parser, GUI)
+        self.setWindowTitle("Magia_faults_GUI - programmed by WWWYJ")
+        self.setStyleSheet("background-color: #333333; color: white;")
+
+        splitter = QtWidgets.QSplitter(QtCore.Qt.Horizontal)
+        self.setCentralWidget(splitter)
+
+        side = QtWidgets.QWidget()
+        side_layout = QtWidgets.QVBoxLayout(side)
+        self.file_list = QtWidgets.QListWidget()
+        self.file_list.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.file_list.setStyleSheet("background-color: #444444; color: white;")
+        self.file_list.currentItemChanged.connect(self.show_file)
+        side_layout.addWidget(self.file_list)
+
+        open_btn = QtWidgets.QPushButton("Open .flts...")
+        open_btn.setStyleSheet("background-color: #555555; color: white;")
+        open_btn.clicked.connect(self.open_files)
+        side_layout.addWidget(open_btn)
+
+        self.run_selected_button = QtWidgets.QPushButton("Run selected && overlay")
+        self.run_selected_button.setStyleSheet("background-color: #555555; color: white;")
+        self.run_selected_button.clicked.connect(self.run_selected)
+        side_layout.addWidget(self.run_selected_button)
+
+        peak_btn = QtWidgets.QPushButton("Peak table from .dat...")
+        peak_btn.setStyleSheet("background-color: #555555; color: white;")
+        peak_btn.clicked.connect(self.export_peak_table)
+        side_layout.addWidget(peak_btn)
+        splitter.addWidget(side)
+
+        self.stack = QtWidgets.QStackedWidget()
+        splitter.addWidget(self.stack)
+        splitter.setStretchFactor(1, 1)
+
+        for path in flts_paths:
+            self.add_file(path)
+        if self.file_list.count():
+            self.file_list.setCurrentRow(0)
+
+    def add_file(self, flts_path: str):
+        path = os.path.abspath(flts_path)
+        for i in range(self.file_list.count()):
+            if self.file_list.item(i).data(QtCore.Qt.UserRole) == path:
+                return
+        item = QtWidgets.QListWidgetItem(os.path.basename(path))
+        item.setToolTip(path)
+        item.setData(QtCore.Qt.UserRole, path)
+        self.file_list.addItem(item)
+
+    def open_files(self):
+        paths, _ = QtWidgets.QFileDialog.getOpenFileNames(self, "Open .flts", os.getcwd(), "FLTS files (*.flts)")
+        for path in paths:
+            self.add_file(path)
+
+    def editor_for(self, path: str) -> 'GUI':
+        parser = self.cache.get(path)
+        cached = self.editors.get(path)
+        if cached and cached[0] is parser:
+            return cached[1]
+        if cached:
+            self.stack.removeWidget(cached[1])
+            cached[1].deleteLater()
+        gui = GUI(parser, parser.flts_path, None)
+        gui.setWindowFlags(QtCore.Qt.Widget)
+        self.stack.addWidget(gui)
+        self.editors[path] = (parser, gui)
+        # 解析器被 LRU 淘汰后，对应的编辑器也一并释放
+        for other, (p, g) in list(self.editors.items()):
+            if p not in self.cache:
+                self.stack.removeWidget(g)
+                g.deleteLater()
+                del self.editors[other]
+        return gui
+
+    def show_file(self, item, _previous=None):
+        if item is None:
+            return
+        path = item.data(QtCore.Qt.UserRole)
+        try:
+            gui = self.editor_for(path)
+        except OSError as e:
+            QtWidgets.QMessageBox.critical(self, "错误", f"无法打开 {path}：{e}")
+            return
+        self.stack.setCurrentWidget(gui)
+
+    def run_selected(self):
+        paths = [item.data(QtCore.Qt.UserRole) for item in self.file_list.selectedItems()]
+        if not paths:
+            return
+        flts_paths, errors = [], []
+        for path in paths:
+            try:
+                parser = self.editors[path][0] if path in self.editors else self.cache.get(path)
+                parser.write_flts_file()
+            except OSError as e:
+                errors.append(f"{os.path.basename(path)}: {e}")
+                continue
+            flts_paths.append(parser.flts_path)
+        if not flts_paths:
+            QtWidgets.QMessageBox.critical(self, "错误", "\n".join(errors))
+            return
+        # 在后台线程中运行，界面保持响应；运行期间禁用按钮避免重复提交
+        self.run_selected_button.setEnabled(False)
+        self.batch_errors = errors
+        self.batch_thread = FaultsBatchThread(flts_paths, self)
+        self.batch_thread.done.connect(self.batch_finished)
+        self.batch_thread.finished.connect(self.batch_thread.deleteLater)
+        self.batch_thread.start()
+
+    def batch_finished(self, spectra, errors):
+        # done 信号由后台线程发出，Qt 将其排队到界面线程中调用本方法
+        self.run_selected_button.setEnabled(True)
+        self.batch_thread = None
+        errors = self.batch_errors + errors
+        if errors:
+            QtWidgets.QMessageBox.critical(self, "错误", "\n".join(errors))
+        if spectra:
+            plot_spectra(spectra, 'Simulated Spectra')
+
+    def export_peak_table(self):
+        dat_paths, _ = QtWidgets.QFileDialog.getOpenFileNames(self, "Select .dat files", os.getcwd(), "DAT files (*.dat)")
+        if not dat_paths:
+            return
+        spectra, errors = [], []
+        for path in sorted(dat_paths):
+            name = os.path.basename(path)
+            try:
+                two_theta, intensities = read_dat_file(path)
+            except (OSError, ValueError, IndexError) as e:
+                errors.append(f"{name}: {e}")
+                continue
+            spectra.append((name, two_theta, intensities))
+        if errors:
+            QtWidgets.QMessageBox.critical(self, "错误", "\n".join(errors))
+        if not spectra:
+            return
+        table = peak_feature_table(spectra)
+        csv_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Save peak table", os.path.join(os.path.dirname(dat_paths[0]), 'peaks.csv'), "CSV files (*.csv)")
+        if not csv_path:
+            return
+        save_feature_table(table, csv_path)
+        QtWidgets.QMessageBox.information(self, "完成", f"已从 {len(spectra)} 个谱图提取 {len(table['peak'])} 个峰，保存到 {csv_path}。")
 
 def main():
-    flts_path = 'Li3YCl6_8layers.flts'  # Replace if needed
-    dat_path = 'Li3YCl6_Model1_6.dat'  # Replace if needed
-    parser = FLTSParser(flts_path)
+    # 可在命令行给出多个 .flts 文件，否则打开默认文件
+    flts_paths = sys.argv[1:] or ['Li3YCl6_8layers.flts']  # Replace if needed
     app = QtWidgets.QApplication(sys.argv)
-    gui = GUI(parser, parser.flts_path, dat_path)
-    gui.show()
+    workspace = Workspace(flts_paths)
+    workspace.resize(1400, 900)
+    workspace.show()
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
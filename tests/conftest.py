@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+
+FAKE_FAULTS = '''#!{python}
+import os
+import sys
+import time
+
+text = open(sys.argv[1]).read()
+if 'fail' in text:
+    sys.exit(1)
+if 'slow' in text:
+    with open(os.environ['FAKE_FAULTS_PIDFILE'], 'a') as f:
+        f.write('%d\\n' % os.getpid())
+    time.sleep(60)
+if 'nodat' not in text:
+    with open('out_%d.dat' % os.getpid(), 'w') as f:
+        f.write('title\\n10.0 0.5 0\\n1 2 3 4\\n')
+'''
+
+SAMPLE_FLTS = '''TITLE
+sample
+STRUCTURAL
+Cell 3.5 6.0 5.9 90.0 90.0 120.0
+NLAYERS 2
+STACKING
+INFINITE 1000
+TRANSITIONS
+!layer 1 to layer 1
+  LT 0.70 0 0 0
+  FW 0 0 0 0 0 0
+!layer 1 to layer 2
+  LT 0.30 0.333333 0 1
+  FW 0 0 0 0 0 0
+!layer 2 to layer 1
+  LT 1.00 0 0 1
+  FW 0 0 0 0 0 0
+SIMULATION
+POWDER 10.0 60.0 0.5 0 0
+FILE ./exp.dat
+'''
+
+
+@pytest.fixture
+def flts_path(tmp_path):
+    project = tmp_path / 'project'
+    project.mkdir()
+    (project / 'exp.dat').write_text('experimental\n0.0 1.0 0\n9 9 9\n')
+    path = project / 'sample.flts'
+    path.write_text(SAMPLE_FLTS)
+    return str(path)
+
+
+@pytest.fixture
+def fake_faults(tmp_path, monkeypatch):
+    # 用 Python 脚本代替 Faults：标题含 fail 时返回非零，含 slow 时记录 pid 并挂起，含 nodat 时不生成 .dat
+    if os.name == 'nt':
+        pytest.skip('fake Faults script requires a POSIX shebang')
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'Faults'
+    script.write_text(FAKE_FAULTS.format(python=sys.executable))
+    script.chmod(0o755)
+    pidfile = tmp_path / 'faults.pid'
+    monkeypatch.setenv('PATH', str(bin_dir) + os.pathsep + os.environ.get('PATH', ''))
+    monkeypatch.setenv('FAKE_FAULTS_PIDFILE', str(pidfile))
+    return pidfile
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('matplotlib')
+pytest.importorskip('PyQt5')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Magia_FAULTS_GUI as mfg
+
+
+def gaussian(x, center, sigma, area):
+    return area / (sigma * np.sqrt(2 * np.pi)) * np.exp(-(x - center) ** 2 / (2 * sigma ** 2))
+
+
+def test_intensities_positive_on_multi_peak_pattern():
+    x = np.arange(10.0, 60.0, 0.01)
+    y = 10.0 + gaussian(x, 20.0, 0.1, 200.0) + gaussian(x, 35.0, 0.1, 160.0) + gaussian(x, 35.6, 0.1, 120.0)
+    feats = mfg.peak_features(x, y)
+    np.testing.assert_allclose(feats['position'], [20.0, 35.0, 35.6], atol=0.01)
+    assert np.all(feats['intensity'] > 0)
+    np.testing.assert_allclose(feats['intensity'], [200.0, 160.0, 120.0], rtol=0.05)
+
+
+def test_feature_table_tracks_drifting_peak():
+    x = np.arange(10.0, 60.0, 0.01)
+    spectra = [(f'run{k}', x, 5.0 + gaussian(x, 30.0 + 0.05 * k, 0.1, 100.0)) for k in range(20)]
+    table = mfg.peak_feature_table(spectra)
+    assert set(table['peak'].tolist()) == {0}
+
+
+def test_noise_does_not_produce_spurious_peaks():
+    x = np.arange(10.0, 60.0, 0.01)
+    rng = np.random.default_rng(0)
+    y = gaussian(x, 30.0, 0.1, 25.0) + rng.normal(0.0, 1.0, x.size)
+    peaks = mfg.find_peak_indices(y)
+    assert peaks.size == 1
+    assert abs(x[peaks[0]] - 30.0) < 0.05
+
+
+def test_single_point_spike_rejected():
+    x = np.arange(10.0, 60.0, 0.01)
+    y = gaussian(x, 30.0, 0.1, 25.0)
+    y[500] = 50.0
+    np.testing.assert_array_equal(mfg.find_peak_indices(y), [2000])
+
+
+def test_feature_table_matches_one_to_one():
+    x = np.arange(10.0, 60.0, 0.01)
+    spectra = [
+        ('single', x, 5.0 + gaussian(x, 30.0, 0.1, 25.0)),
+        ('split', x, 5.0 + gaussian(x, 29.95, 0.05, 12.0) + gaussian(x, 30.1, 0.05, 12.0)),
+    ]
+    table = mfg.peak_feature_table(spectra, tolerance=0.2)
+    split_ids = table['peak'][table['run'] == 'split']
+    assert len(split_ids) == 2 and len(set(split_ids.tolist())) == 2
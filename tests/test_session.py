@@ -0,0 +1,115 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('matplotlib')
+pytest.importorskip('PyQt5')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Magia_FAULTS_GUI as mfg
+
+
+@pytest.fixture
+def scratch(tmp_path):
+    path = tmp_path / 'scratch'
+    path.mkdir()
+    return str(path)
+
+
+def test_format_value():
+    assert mfg.Session.format_value(1500000) == '1500000'
+    assert mfg.Session.format_value(np.int64(7)) == '7'
+    assert mfg.Session.format_value(0.1234567890123) == '0.1234567890123'
+    assert mfg.Session.format_value(np.float64(1e-9)) == '1e-09'
+    assert mfg.Session.format_value('TRIM') == 'TRIM'
+
+
+def test_set_changes_value_in_place(flts_path):
+    session = mfg.Session(flts_path)
+    n_lines = len(session.parser.lines)
+    session.set('STRUCTURAL', None, 'Cell', 1, 6.5)
+    session.set('STACKING', None, 'INFINITE', 0, 1500000)
+    session.set('TITLE', None, 'Title_Text', 0, 'new title')
+    assert len(session.parser.lines) == n_lines
+    assert session.get('STRUCTURAL', None, 'Cell', 1) == '6.5'
+    assert 'Cell 3.5 6.5 5.9 90.0 90.0 120.0\n' in session.parser.lines
+    assert 'INFINITE 1500000\n' in session.parser.lines
+    assert session.parser.lines[1] == 'new title\n'
+    with pytest.raises(IndexError):
+        session.set('STRUCTURAL', None, 'Cell', 6, 1.0)
+
+
+def test_set_many(flts_path):
+    session = mfg.Session(flts_path)
+    keys = [('TRANSITIONS', 'layer 1 to layer 2', 'LT', 0), ('STACKING', None, 'INFINITE', 0)]
+    session.set_many(keys, [0.25, 2000])
+    assert [session.get(*key) for key in keys] == ['0.25', '2000']
+    session.set_many(keys[:1], np.array([0.125]))
+    assert session.get(*keys[0]) == '0.125'
+    with pytest.raises(ValueError):
+        session.set_many(keys, [0.1])
+
+
+def test_run_does_not_rewrite_flts(flts_path, fake_faults, scratch):
+    with open(flts_path) as f:
+        before = f.read()
+    session = mfg.Session(flts_path, scratch_root=scratch)
+    session.set('TRANSITIONS', 'layer 1 to layer 2', 'LT', 0, 0.2)
+    two_theta, intensities = session.run()
+    np.testing.assert_allclose(intensities, [1, 2, 3, 4])
+    with open(flts_path) as f:
+        assert f.read() == before
+    assert os.listdir(scratch) == []
+
+
+def test_run_sessions_return_exceptions(flts_path, fake_faults, scratch):
+    base = mfg.Session(flts_path, scratch_root=scratch)
+    variants = [base.copy() for _ in range(3)]
+    variants[1].set('TITLE', None, 'Title_Text', 0, 'fail')
+    results = asyncio.run(mfg.run_sessions(variants, limit=2, return_exceptions=True))
+    assert isinstance(results[1], subprocess.CalledProcessError)
+    for result in (results[0], results[2]):
+        np.testing.assert_allclose(result[1], [1, 2, 3, 4])
+    with pytest.raises(subprocess.CalledProcessError):
+        asyncio.run(mfg.run_sessions(variants, limit=2))
+
+
+def test_cancel_kills_faults(flts_path, fake_faults, scratch):
+    session = mfg.Session(flts_path, scratch_root=scratch)
+    session.set('TITLE', None, 'Title_Text', 0, 'slow')
+
+    async def run_and_cancel():
+        task = asyncio.ensure_future(mfg.run_sessions([session.copy() for _ in range(2)], limit=2))
+        for _ in range(200):
+            if fake_faults.exists() and len(fake_faults.read_text().split()) == 2:
+                break
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run_and_cancel())
+    pids = [int(p) for p in fake_faults.read_text().split()]
+    assert len(pids) == 2
+    for pid in pids:
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
+    assert os.listdir(scratch) == []
+
+
+def test_run_sessions_cleans_every_scratch_root(flts_path, fake_faults, tmp_path):
+    roots = []
+    for name in ('a', 'b'):
+        root = tmp_path / name
+        stale = root / (mfg.SCRATCH_PREFIX + 'stale')
+        stale.mkdir(parents=True)
+        os.utime(stale, (0, 0))
+        roots.append(str(root))
+    sessions = [mfg.Session(flts_path, scratch_root=root) for root in roots]
+    asyncio.run(mfg.run_sessions(sessions))
+    for root in roots:
+        assert os.listdir(root) == []
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('matplotlib')
+pytest.importorskip('PyQt5')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Magia_FAULTS_GUI as mfg
+
+
+def test_staged_run_reads_new_dat_and_keeps_inputs(flts_path, fake_faults, tmp_path):
+    scratch = tmp_path / 'scratch'
+    scratch.mkdir()
+    two_theta, intensities = mfg.run_faults_staged(flts_path, str(scratch))
+    np.testing.assert_allclose(two_theta, [10.0, 10.5, 11.0, 11.5])
+    np.testing.assert_allclose(intensities, [1, 2, 3, 4])
+    project = os.path.dirname(flts_path)
+    with open(os.path.join(project, 'exp.dat')) as f:
+        assert f.read().startswith('experimental')
+    assert len(os.listdir(scratch)) == 0
+
+
+def test_staged_run_without_output_does_not_return_referenced_input(flts_path, fake_faults, tmp_path):
+    with open(flts_path) as f:
+        text = f.read().replace('sample', 'nodat')
+    scratch = tmp_path / 'scratch'
+    scratch.mkdir()
+    with pytest.raises(mfg.DatFileNotFoundError):
+        mfg.run_faults_staged(flts_path, str(scratch), lines=text.splitlines(True))
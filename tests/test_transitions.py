@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('matplotlib')
+pytest.importorskip('PyQt5')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Magia_FAULTS_GUI as mfg
+
+
+def test_unchanged_matrix_leaves_lines_untouched(flts_path):
+    parser = mfg.FLTSParser(flts_path)
+    before = list(parser.lines)
+    assert mfg.set_transition_matrix(parser, mfg.get_transition_matrix(parser)) == 0
+    assert parser.lines == before
+
+
+def test_only_changed_values_written_at_full_precision(flts_path):
+    parser = mfg.FLTSParser(flts_path)
+    before = list(parser.lines)
+    matrix = mfg.get_transition_matrix(parser)
+    matrix[0, 1] = 0.123456789012345
+    assert mfg.set_transition_matrix(parser, matrix) == 1
+    changed = [line for line, old in zip(parser.lines, before) if line != old]
+    assert changed == ['  LT 0.123456789012345 0.333333 0 1\n']
+    assert mfg.get_transition_matrix(parser)[0, 1] == 0.123456789012345
+
+
+@pytest.mark.parametrize('probs', [{-1: 0.7, 2: 0.6}, {-1: -0.1}, {2: 1.2}, {-1: float('nan')}])
+def test_fault_probabilities_out_of_range_rejected(probs):
+    with pytest.raises(ValueError):
+        mfg.fault_transition_matrix(6, probs)
+
+
+@pytest.mark.parametrize('n, probs', [(2, {2: 0.1}), (2, {-1: 0.1}), (3, {-1: 0.1, 2: 0.1})])
+def test_fault_offsets_that_wrap_rejected(n, probs):
+    with pytest.raises(ValueError):
+        mfg.fault_transition_matrix(n, probs)
+
+
+def test_fault_matrix_rows_sum_to_one():
+    matrix = mfg.fault_transition_matrix(6, {-1: 0.1, 2: 0.05})
+    np.testing.assert_allclose(matrix.sum(axis=1), 1.0)
+    assert matrix[0, 1] == pytest.approx(0.85)
+    assert mfg.fault_transition_matrix(2, {-1: 0.0, 2: 0.0})[0, 1] == 1.0